@@ -1,21 +1,37 @@
-from copy import deepcopy
 from math import ceil, floor
-from struct import pack, unpack
 import calendar
 import datetime
+import errno
 import numpy as np
 import os
 import re
 import warnings
 
+# patterns for the highpass and lowpass settings in the prefiltering field
+_HP_RE = re.compile(r'HP:\s+(\w+)')
+_LP_RE = re.compile(r'LP:\s+(\w+)')
+
+# the start date and time are stored as dd.mm.yy and hh.mm.ss
+_DATETIME_FMT = '%02d.%02d.%02d'
+
 def padtrim(buf, num):
-    num -= len(buf)
-    if num>=0:
-        # pad the input to the specified length
-        return str(buf) + ' ' * num
-    else:
-        # trim the input to the specified length
-        return buf[0:num]
+    # pad or trim the input to the specified length, the header fields are ASCII encoded bytes
+    if not isinstance(buf, bytes):
+        buf = str(buf).encode('ascii')
+    return buf.ljust(num)[:num]
+
+def padtrim_array(values, num):
+    # pad or trim all values to the specified length and concatenate them, formatting is done by numpy in a single pass
+    values = np.char.mod('%s', np.asarray(values))
+    return np.char.ljust(values, num).astype('S%d' % num).tobytes()
+
+def int24(buf):
+    # convert little-endian 24-bit integers, as used in BDF files, to int32
+    # each value is placed in the upper three bytes of an int32, the arithmetic shift then extends the sign
+    buf = np.asarray(buf, dtype=np.uint8).reshape(-1, 3)
+    tmp = np.zeros((buf.shape[0], 4), dtype=np.uint8)
+    tmp[:, 1:] = buf
+    return tmp.view('<i4').reshape(-1) >> 8
 
 ####################################################################################################
 # the EDF header is represented as a tuple of (meas_info, chan_info)
@@ -30,41 +46,45 @@ class EDFWriter():
         self.chan_info = None
         self.calibrate = None
         self.offset    = None
+        self._calibrate_col = None
+        self._offset_col    = None
+        self._digital_min_col = None
+        self._digital_max_col = None
         self.n_records = 0
+        self._fid      = None
+        self._record   = None
+        self._samp_offsets = None
+        self._uniform      = None
+        self.validate  = True  # set to False to skip checking the data against the physical range
         if fname:
             self.open(fname)
 
     def open(self, fname):
-        with open(fname, 'wb') as fid:
-            assert(fid.tell() == 0)
+        # the file is created once the header is written
         self.fname = fname
 
     def close(self):
         # it is still needed to update the number of records in the header
-        # this requires copying the whole file content
-        meas_info = self.meas_info
-        chan_info = self.chan_info
-        # update the n_records value in the file
-        tempname = self.fname + '.bak'
-        os.rename(self.fname, tempname)
-        with open(tempname, 'rb') as fid1:
-            assert(fid1.tell() == 0)
-            with open(self.fname, 'wb') as fid2:
-                assert(fid2.tell() == 0)
-                fid2.write(fid1.read(236))
-                fid1.read(8)                                    # skip this part
-                fid2.write(padtrim(str(self.n_records), 8))     # but write this instead
-                fid2.write(fid1.read(meas_info['data_offset'] - 236 - 8))
-                blocksize = np.sum(chan_info['n_samps']) * meas_info['data_size']
-                for block in range(self.n_records):
-                    fid2.write(fid1.read(blocksize))
-        os.remove(tempname)
+        # this is done in place, the rest of the file remains untouched
+        if self._fid is not None:
+            self._fid.close()
+            self._fid = None
+        with open(self.fname, 'r+b') as fid:
+            fid.seek(236)
+            fid.write(padtrim(str(self.n_records), 8))
         self.fname = None
         self.meas_info = None
         self.chan_info = None
         self.calibrate = None
         self.offset    = None
+        self._calibrate_col = None
+        self._offset_col    = None
+        self._digital_min_col = None
+        self._digital_max_col = None
         self.n_records = 0
+        self._record   = None
+        self._samp_offsets = None
+        self._uniform      = None
         return
 
     def writeHeader(self, header):
@@ -72,65 +92,66 @@ class EDFWriter():
         chan_info = header[1]
         meas_size = 256
         chan_size = 256 * meas_info['nchan']
-        with open(self.fname, 'wb') as fid:
-            assert(fid.tell() == 0)
-
-            # fill in the missing or incomplete information
-            if not 'subject_id' in meas_info:
-                meas_info['subject_id'] = ''
-            if not 'recording_id' in meas_info:
-                meas_info['recording_id'] = ''
-            if not 'subtype' in meas_info:
-                meas_info['subtype'] = 'edf'
-            nchan = meas_info['nchan']
-            if not 'ch_names' in chan_info or len(chan_info['ch_names'])<nchan:
-                chan_info['ch_names'] = [str(i) for i in range(nchan)]
-            if not 'transducers' in chan_info or len(chan_info['transducers'])<nchan:
-                chan_info['transducers'] = ['' for i in range(nchan)]
-            if not 'units' in chan_info or len(chan_info['units'])<nchan:
-                chan_info['units'] = ['' for i in range(nchan)]
-
-            if meas_info['subtype'] in ('24BIT', 'bdf'):
-                meas_info['data_size'] = 3  # 24-bit (3 byte) integers
-            else:
-                meas_info['data_size'] = 2  # 16-bit (2 byte) integers
-
-            fid.write(padtrim('0', 8))
-            fid.write(padtrim(meas_info['subject_id'], 80))
-            fid.write(padtrim(meas_info['recording_id'], 80))
-            fid.write(padtrim('{:0>2d}.{:0>2d}.{:0>2d}'.format(meas_info['day'], meas_info['month'], meas_info['year']), 8))
-            fid.write(padtrim('{:0>2d}.{:0>2d}.{:0>2d}'.format(meas_info['hour'], meas_info['minute'], meas_info['second']), 8))
-            fid.write(padtrim(str(meas_size + chan_size), 8))
-            fid.write(' ' * 44)
-            fid.write(padtrim(str(-1), 8))  # the final n_records should be inserted on byte 236
-            fid.write(padtrim(str(meas_info['record_length']), 8))
-            fid.write(padtrim(str(meas_info['nchan']), 4))
-
-            # ensure that these are all np arrays rather than lists
-            for key in ['physical_min', 'transducers', 'physical_max', 'digital_max', 'ch_names', 'n_samps', 'units', 'digital_min']:
-                chan_info[key] = np.asarray(chan_info[key])
-
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(    chan_info['ch_names'][i], 16))
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(    chan_info['transducers'][i], 80))
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(    chan_info['units'][i], 8))
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(str(chan_info['physical_min'][i]), 8))
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(str(chan_info['physical_max'][i]), 8))
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(str(chan_info['digital_min'][i]), 8))
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(str(chan_info['digital_max'][i]), 8))
-            for i in range(meas_info['nchan']):
-                fid.write(' ' * 80) # prefiltering
-            for i in range(meas_info['nchan']):
-                fid.write(padtrim(str(chan_info['n_samps'][i]), 8))
-            for i in range(meas_info['nchan']):
-                fid.write(' ' * 32) # reserved
-            meas_info['data_offset'] = fid.tell()
+        # the file remains open for appending the data records, these are written through the same buffer as the header
+        self._fid = fid = open(self.fname, 'wb', buffering=1024*1024)
+        assert(fid.tell() == 0)
+
+        # fill in the missing or incomplete information
+        if not 'subject_id' in meas_info:
+            meas_info['subject_id'] = ''
+        if not 'recording_id' in meas_info:
+            meas_info['recording_id'] = ''
+        if not 'subtype' in meas_info:
+            meas_info['subtype'] = 'edf'
+        nchan = meas_info['nchan']
+        if not 'ch_names' in chan_info or len(chan_info['ch_names'])<nchan:
+            chan_info['ch_names'] = [str(i) for i in range(nchan)]
+        if not 'transducers' in chan_info or len(chan_info['transducers'])<nchan:
+            chan_info['transducers'] = ['' for i in range(nchan)]
+        if not 'units' in chan_info or len(chan_info['units'])<nchan:
+            chan_info['units'] = ['' for i in range(nchan)]
+
+        if meas_info['subtype'] in ('24BIT', 'bdf'):
+            meas_info['data_size'] = 3  # 24-bit (3 byte) integers
+        else:
+            meas_info['data_size'] = 2  # 16-bit (2 byte) integers
+
+        # the complete header is collected in memory and written at once
+        hdr = [padtrim('0', 8)]
+        hdr.append(padtrim(meas_info['subject_id'], 80))
+        hdr.append(padtrim(meas_info['recording_id'], 80))
+        hdr.append(padtrim(_DATETIME_FMT % (meas_info['day'], meas_info['month'], meas_info['year'] % 100), 8))
+        hdr.append(padtrim(_DATETIME_FMT % (meas_info['hour'], meas_info['minute'], meas_info['second']), 8))
+        hdr.append(padtrim(str(meas_size + chan_size), 8))
+        hdr.append(b' ' * 44)
+        hdr.append(padtrim(str(-1), 8))  # the final n_records should be inserted on byte 236
+        hdr.append(padtrim(str(meas_info['record_length']), 8))
+        hdr.append(padtrim(str(meas_info['nchan']), 4))
+
+        # ensure that these are all np arrays rather than lists
+        for key in ['physical_min', 'transducers', 'physical_max', 'digital_max', 'ch_names', 'n_samps', 'units', 'digital_min']:
+            chan_info[key] = np.asarray(chan_info[key])
+
+        # add each header field for all channels at once
+        hdr.append(padtrim_array(chan_info['ch_names'],     16))
+        hdr.append(padtrim_array(chan_info['transducers'],  80))
+        hdr.append(padtrim_array(chan_info['units'],         8))
+        hdr.append(padtrim_array(chan_info['physical_min'],  8))
+        hdr.append(padtrim_array(chan_info['physical_max'],  8))
+        hdr.append(padtrim_array(chan_info['digital_min'],   8))
+        hdr.append(padtrim_array(chan_info['digital_max'],   8))
+        hdr.append(b' ' * 80 * nchan) # prefiltering
+        hdr.append(padtrim_array(chan_info['n_samps'],       8))
+        hdr.append(b' ' * 32 * nchan) # reserved
+        hdr = b''.join(hdr)
+        fid.write(hdr)
+        meas_info['data_offset'] = len(hdr)
+
+        # the offset of each channel within a record, and whether all channels have the same number of samples
+        self._samp_offsets = np.concatenate(([0], np.cumsum(chan_info['n_samps'])))
+        self._uniform      = np.all(chan_info['n_samps'] == chan_info['n_samps'][0])
+        # the digital values of one record are collected in this buffer, which is reused for every record
+        self._record = np.zeros(self._samp_offsets[-1], dtype='<i2')
 
         self.meas_info = meas_info
         self.chan_info = chan_info
@@ -141,29 +162,89 @@ class EDFWriter():
             if self.calibrate[ch]<0:
               self.calibrate[ch] = 1;
               self.offset[ch]    = 0;
+        # column vectors that broadcast over all channels of a record
+        self._calibrate_col = self.calibrate[:, None]
+        self._offset_col    = self.offset[:, None]
+        self._digital_min_col = chan_info['digital_min'][:, None]
+        self._digital_max_col = chan_info['digital_max'][:, None]
 
     def writeBlock(self, data):
         meas_info = self.meas_info
         chan_info = self.chan_info
-        with open(self.fname, 'ab') as fid:
-            assert(fid.tell() > 0)
+        n_samps = chan_info['n_samps']
+        # if all channels have the same number of samples, the record can be treated as a 2D array
+        uniform = self._uniform
+        if uniform:
+            data = np.asarray(data)
+            assert(data.shape==(meas_info['nchan'], n_samps[0]))
+        else:
+            data = [np.asarray(x) for x in data]
             for i in range(meas_info['nchan']):
-                raw = deepcopy(data[i])
-
-                assert(len(raw)==chan_info['n_samps'][i])
-                if min(raw)<chan_info['physical_min'][i]:
-                    warnings.warn('Value exceeds physical_min: ' + str(min(raw)) );
-                if max(raw)>chan_info['physical_max'][i]:
-                    warnings.warn('Value exceeds physical_max: '+ str(max(raw)));
+                assert(len(data[i])==n_samps[i])
 
-                raw -= self.offset[i]  # FIXME I am not sure about the order of calibrate and offset
+        if self.validate:
+            if uniform:
+                self._checkRange(data.min(axis=1), data.max(axis=1))
+            else:
+                self._checkRange(np.array([x.min() for x in data]), np.array([x.max() for x in data]))
+
+        # subtracting the offset also makes the float64 copy that is subsequently modified in place
+        # values outside the digital range are clipped, rather than wrapping around when stored as int16
+        record = self._record
+        if uniform:
+            raw = np.subtract(data, self._offset_col, dtype=np.float64)  # FIXME I am not sure about the order of calibrate and offset
+            raw /= self._calibrate_col
+            np.rint(raw, out=raw)
+            np.clip(raw, self._digital_min_col, self._digital_max_col, out=raw)
+            record[:] = raw.reshape(-1)
+        else:
+            offsets = self._samp_offsets
+            for i in range(meas_info['nchan']):
+                raw = np.subtract(data[i], self.offset[i], dtype=np.float64)
                 raw /= self.calibrate[i]
+                np.rint(raw, out=raw)
+                np.clip(raw, chan_info['digital_min'][i], chan_info['digital_max'][i], out=raw)
+                record[offsets[i]:offsets[i+1]] = raw
+        # write all channels of the record at once
+        self._fid.write(record)
+        self.n_records += 1
+
+    def writeAllBlocks(self, data):
+        # this writes multiple records at once, the input has one row per record with the channels concatenated
+        meas_info = self.meas_info
+        offsets = self._samp_offsets
+        data = np.asarray(data)
+        assert(data.ndim==2 and data.shape[1]==offsets[-1])
+        channels = list(range(meas_info['nchan']))
 
-                raw = np.asarray(raw, dtype=np.int16)
-                buf = [pack('h', x) for x in raw]
-                for val in buf:
-                    fid.write(val)
-            self.n_records += 1
+        if self.validate:
+            self._checkRange(np.array([data[:, offsets[i]:offsets[i+1]].min() for i in channels]),
+                             np.array([data[:, offsets[i]:offsets[i+1]].max() for i in channels]))
+
+        # expand the calibration of each channel to each of its samples in a record
+        chan_info = self.chan_info
+        n_samps = chan_info['n_samps']
+        raw = np.subtract(data, np.repeat(self.offset, n_samps), dtype=np.float64)
+        raw /= np.repeat(self.calibrate, n_samps)
+        np.rint(raw, out=raw)
+        np.clip(raw, np.repeat(chan_info['digital_min'], n_samps), np.repeat(chan_info['digital_max'], n_samps), out=raw)
+        self._fid.write(raw.astype('<i2'))
+        self.n_records += data.shape[0]
+
+    def writeBody(self, data):
+        # this writes uncalibrated digital values for multiple records at once, e.g. from EDFReader.readBody
+        # the input has one row per record with the channels concatenated and is written without conversion
+        data = np.asarray(data)
+        assert(data.dtype==np.int16 and data.ndim==2 and data.shape[1]==self._samp_offsets[-1])
+        self._fid.write(np.ascontiguousarray(data, dtype='<i2'))
+        self.n_records += data.shape[0]
+
+    def _checkRange(self, raw_min, raw_max):
+        # check all channels against their physical range and report them in a single warning
+        chan_info = self.chan_info
+        exceeds = (raw_min<chan_info['physical_min']) | (raw_max>chan_info['physical_max'])
+        if np.any(exceeds):
+            warnings.warn('Value exceeds physical_min or physical_max in channel: ' + ', '.join([str(x) for x in chan_info['ch_names'][exceeds]]))
 
 ####################################################################################################
 
@@ -174,12 +255,18 @@ class EDFReader():
         self.chan_info = None
         self.calibrate = None
         self.offset    = None
+        self._calibrate_col = None
+        self._offset_col    = None
+        self._mm       = None
+        self._chan_offsets = None
+        self._samp_offsets = None
+        self._uniform      = None
         if fname:
             self.open(fname)
 
     def open(self, fname):
-        with open(fname, 'rb') as fid:
-            assert(fid.tell() == 0)
+        if not os.path.isfile(fname):
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), fname)
         self.fname = fname
         self.readHeader()
         return self.meas_info, self.chan_info
@@ -190,6 +277,12 @@ class EDFReader():
         self.chan_info = None
         self.calibrate = None
         self.offset    = None
+        self._calibrate_col = None
+        self._offset_col    = None
+        self._mm       = None
+        self._chan_offsets = None
+        self._samp_offsets = None
+        self._uniform      = None
 
     def readHeader(self):
         # the following is copied over from MNE-Python and subsequently modified
@@ -199,12 +292,15 @@ class EDFReader():
         with open(self.fname, 'rb') as fid:
             assert(fid.tell() == 0)
 
-            meas_info['magic']        = fid.read(8).strip().decode()
+            meas_info['magic']        = fid.read(8).strip().decode('latin-1')  # BDF files start with 0xFF
             meas_info['subject_id']   = fid.read(80).strip().decode()  # subject id
             meas_info['recording_id'] = fid.read(80).strip().decode()  # recording id
 
-            day, month, year     = [int(x) for x in re.findall('(\d+)', fid.read(8).decode())]
-            hour, minute, second = [int(x) for x in re.findall('(\d+)', fid.read(8).decode())]
+            # the date and time are stored as dd.mm.yy and hh.mm.ss
+            startdate = fid.read(8)
+            starttime = fid.read(8)
+            day, month, year     = int(startdate[0:2]), int(startdate[3:5]), int(startdate[6:8])
+            hour, minute, second = int(starttime[0:2]), int(starttime[3:5]), int(starttime[6:8])
             meas_info['day'] = day
             meas_info['month'] = month
             meas_info['year'] = year
@@ -240,21 +336,31 @@ class EDFReader():
             meas_info['nchan'] = nchan = int(fid.read(4).decode())
 
             channels = list(range(nchan))
-            chan_info['ch_names']     = [fid.read(16).strip().decode() for ch in channels]
-            chan_info['transducers']  = [fid.read(80).strip().decode() for ch in channels]
-            chan_info['units']        = [fid.read(8).strip().decode() for ch in channels]
-            chan_info['physical_min'] = physical_min = np.array([float(fid.read(8).decode()) for ch in channels])
-            chan_info['physical_max'] = physical_max = np.array([float(fid.read(8).decode()) for ch in channels])
-            chan_info['digital_min']  = digital_min  = np.array([float(fid.read(8).decode()) for ch in channels])
-            chan_info['digital_max']  = digital_max  = np.array([float(fid.read(8).decode()) for ch in channels])
-
-            prefiltering = [fid.read(80).strip().decode() for ch in channels][:-1]
-            highpass     = np.ravel([re.findall('HP:\s+(\w+)', filt) for filt in prefiltering])
-            lowpass      = np.ravel([re.findall('LP:\s+(\w+)', filt) for filt in prefiltering])
+
+            # read the header of all channels at once and split it into arrays of fixed-width fields
+            chan_header = fid.read(256 * nchan)
+            fields = {}
+            offset = 0
+            for key, width in [('ch_names', 16), ('transducers', 80), ('units', 8), ('physical_min', 8), ('physical_max', 8),
+                               ('digital_min', 8), ('digital_max', 8), ('prefiltering', 80), ('n_samps', 8), ('reserved', 32)]:
+                fields[key] = np.char.strip(np.frombuffer(chan_header, dtype='S%d' % width, count=nchan, offset=offset))
+                offset += width * nchan
+
+            chan_info['ch_names']     = [x.decode() for x in fields['ch_names']]
+            chan_info['transducers']  = [x.decode() for x in fields['transducers']]
+            chan_info['units']        = [x.decode() for x in fields['units']]
+            chan_info['physical_min'] = fields['physical_min'].astype(np.float64)
+            chan_info['physical_max'] = fields['physical_max'].astype(np.float64)
+            chan_info['digital_min']  = fields['digital_min'].astype(np.float64)
+            chan_info['digital_max']  = fields['digital_max'].astype(np.float64)
+
+            prefiltering = [x.decode() for x in fields['prefiltering']]
+            highpass     = np.array([m.group(1) for m in (_HP_RE.search(filt) for filt in prefiltering) if m])
+            lowpass      = np.array([m.group(1) for m in (_LP_RE.search(filt) for filt in prefiltering) if m])
             high_pass_default = 0.
             if highpass.size == 0:
                 meas_info['highpass'] = high_pass_default
-            elif all(highpass):
+            elif np.all(highpass == highpass[0]):
                 if highpass[0] == 'NaN':
                     meas_info['highpass'] = high_pass_default
                 elif highpass[0] == 'DC':
@@ -262,25 +368,27 @@ class EDFReader():
                 else:
                     meas_info['highpass'] = float(highpass[0])
             else:
-                meas_info['highpass'] = float(np.max(highpass))
+                # compare the settings as numbers, not as strings
+                highpass = np.array([float(x) for x in highpass if x not in ('NaN', 'DC')])
+                meas_info['highpass'] = float(highpass.max()) if highpass.size else high_pass_default
                 warnings.warn('Channels contain different highpass filters. '
                               'Highest filter setting will be stored.')
 
             if lowpass.size == 0:
                 meas_info['lowpass'] = None
-            elif all(lowpass):
+            elif np.all(lowpass == lowpass[0]):
                 if lowpass[0] == 'NaN':
                     meas_info['lowpass'] = None
                 else:
                     meas_info['lowpass'] = float(lowpass[0])
             else:
-                meas_info['lowpass'] = float(np.min(lowpass))
+                lowpass = np.array([float(x) for x in lowpass if x != 'NaN'])
+                meas_info['lowpass'] = float(lowpass.min()) if lowpass.size else None
                 warnings.warn('%s' % ('Channels contain different lowpass filters.'
                                       ' Lowest filter setting will be stored.'))
             # number of samples per record
-            chan_info['n_samps'] = n_samps = np.array([int(fid.read(8).decode()) for ch in channels])
+            chan_info['n_samps'] = n_samps = fields['n_samps'].astype(np.int64)
 
-            fid.read(32 *meas_info['nchan']).decode()  # reserved
             assert fid.tell() == header_nbytes
 
             if meas_info['n_records']==-1:
@@ -288,46 +396,134 @@ class EDFReader():
                 tot_samps = (os.path.getsize(self.fname)-meas_info['data_offset'])/meas_info['data_size']
                 meas_info['n_records'] = tot_samps/sum(n_samps)
 
+        # the offset of each channel within a record in samples and in bytes, and whether all channels have the same number of samples
+        self._samp_offsets = np.concatenate(([0], np.cumsum(chan_info['n_samps'])))
+        self._chan_offsets = self._samp_offsets * meas_info['data_size']
+        self._uniform      = np.all(chan_info['n_samps'] == chan_info['n_samps'][0])
+
+        # map the data records into memory as bytes, each row of the memory map corresponds to one record
+        # slices of the plain ndarray view are regular arrays rather than np.memmap instances
+        # the data section can be shorter than specified in the header, in which case only the complete records are mapped
+        n_records = int(meas_info['n_records'])
+        stride    = int(self._chan_offsets[-1])
+        available = max(0, (os.path.getsize(self.fname) - meas_info['data_offset']) // stride)
+        if available < n_records:
+            warnings.warn('File contains %d complete records rather than %d' % (available, n_records))
+            n_records = meas_info['n_records'] = available
+        if n_records > 0:
+            self._mm = np.asarray(np.memmap(self.fname, dtype=np.uint8, mode='r', offset=meas_info['data_offset'],
+                                            shape=(n_records, stride)))
+        else:
+            self._mm = np.zeros((0, stride), dtype=np.uint8)
+
         self.calibrate = (chan_info['physical_max'] - chan_info['physical_min'])/(chan_info['digital_max'] - chan_info['digital_min']);
         self.offset    =  chan_info['physical_min'] - self.calibrate * chan_info['digital_min'];
         for ch in channels:
             if self.calibrate[ch]<0:
               self.calibrate[ch] = 1;
               self.offset[ch]    = 0;
+        # column vectors that broadcast over all channels of a record, in the precision of the returned data
+        self._calibrate_col = self.calibrate.astype(np.float32)[:, None]
+        self._offset_col    = self.offset.astype(np.float32)[:, None]
 
         self.meas_info = meas_info
         self.chan_info = chan_info
         return (meas_info, chan_info)
 
-    def readBlock(self, block):
+    def _digital(self, raw):
+        # convert the bytes of a channel in one or more records to the digital values
+        # for EDF files this is a view that does not copy the data, unless it is spread over multiple records
+        if self.meas_info['data_size'] == 3:
+            return int24(raw)
+        else:
+            return np.ascontiguousarray(raw).view('<i2').reshape(-1)
+
+    def _physical(self, raw, channel):
+        # convert the digital values of a channel to calibrated values
+        # the multiplication directly produces the float32 output, so no separate conversion pass is needed
+        data = np.multiply(raw, self._calibrate_col[channel], dtype=np.float32)
+        data += self._offset_col[channel]
+        return data
+
+    def readBlockView(self, block):
+        # this returns the uncalibrated digital values, for EDF files as a view into the memory mapped file without making a copy
+        # if all channels have the same number of samples it is a 2D array, otherwise it is a list with one array per channel
         assert(block>=0)
         meas_info = self.meas_info
-        chan_info = self.chan_info
-        data = []
-        with open(self.fname, 'rb') as fid:
-            assert(fid.tell() == 0)
-            blocksize = np.sum(chan_info['n_samps']) * meas_info['data_size']
-            fid.seek(meas_info['data_offset'] + block * blocksize)
+        n_samps = self.chan_info['n_samps']
+        raw = self._mm[block]
+        if self._uniform:
+            return self._digital(raw).reshape(meas_info['nchan'], n_samps[0])
+        else:
+            offsets = self._chan_offsets
+            return [self._digital(raw[offsets[i]:offsets[i+1]]) for i in range(meas_info['nchan'])]
+
+    def readBlock(self, block, out=None):
+        # out can be a preallocated contiguous float32 array with one element per sample in a record,
+        # e.g. np.empty((nchan, nsamples), dtype=np.float32) for uniform files, which is then reused between calls
+        meas_info = self.meas_info
+        raw = self.readBlockView(block)
+        offsets = self._samp_offsets
+        if out is None:
+            out = np.empty(offsets[-1], dtype=np.float32)
+        assert(out.dtype == np.float32 and out.flags.c_contiguous and out.size == offsets[-1])
+        if self._uniform:
+            # convert and calibrate all channels at once
+            data = out.reshape(meas_info['nchan'], -1)
+            np.multiply(raw, self._calibrate_col, out=data)
+            data += self._offset_col  # FIXME I am not sure about the order of calibrate and offset
+            data = list(data)
+        else:
+            # fill the output for the whole record channel by channel
+            data = np.split(out.reshape(-1), offsets[1:-1])
             for i in range(meas_info['nchan']):
-                buf = fid.read(chan_info['n_samps'][i]*meas_info['data_size'])
-                raw = np.asarray(unpack('<{}h'.format(chan_info['n_samps'][i]), buf), dtype=np.float32)
-                raw *= self.calibrate[i]
-                raw += self.offset[i]  # FIXME I am not sure about the order of calibrate and offset
-                data.append(raw)
+                np.multiply(raw[i], self._calibrate_col[i], out=data[i], dtype=np.float32)
+                data[i] += self._offset_col[i]
         return data
 
+    def readBlockChannel(self, block, channel):
+        # this reads a single channel from a block, without converting the other channels
+        assert(block>=0)
+        offsets = self._chan_offsets
+        return self._physical(self._digital(self._mm[block, offsets[channel]:offsets[channel+1]]), channel)
+
     def readSamples(self, channel, begsample, endsample):
         meas_info = self.meas_info
         chan_info = self.chan_info
         n_samps = chan_info['n_samps'][channel]
         begblock = int(floor((begsample) / n_samps))
         endblock = int(floor((endsample) / n_samps))
-        data = self.readBlock(begblock)[channel]
-        for block in range(begblock+1, endblock+1):
-            data = np.append(data, self.readBlock(block)[channel])
+        assert(begblock>=0 and endblock<self._mm.shape[0])
+        # take the samples of this channel from all records at once, rather than appending them block by block
+        offsets = self._chan_offsets
+        raw = self._digital(self._mm[begblock:(endblock+1), offsets[channel]:offsets[channel+1]])
         begsample -= begblock*n_samps
         endsample -= begblock*n_samps
-        return data[begsample:(endsample+1)]
+        return self._physical(raw[begsample:(endsample+1)], channel)
+
+    def readAll(self):
+        # this reads all records at once and returns a list with the complete signal of each channel
+        offsets = self._chan_offsets
+        return [self._physical(self._digital(self._mm[:, offsets[i]:offsets[i+1]]), i) for i in range(self.meas_info['nchan'])]
+
+    def readAllBlocks(self):
+        # this reads all records at once, it returns an array with one row per record with the channels concatenated
+        # the output is allocated once and the columns of each channel are filled in place
+        n_records = self._mm.shape[0]
+        chan_offsets = self._chan_offsets
+        samp_offsets = self._samp_offsets
+        data = np.empty((n_records, samp_offsets[-1]), dtype=np.float32)
+        for i in range(self.meas_info['nchan']):
+            chan = data[:, samp_offsets[i]:samp_offsets[i+1]]
+            raw = self._digital(self._mm[:, chan_offsets[i]:chan_offsets[i+1]]).reshape(chan.shape)
+            np.multiply(raw, self._calibrate_col[i], out=chan, dtype=np.float32)
+            chan += self._offset_col[i]
+        return data
+
+    def readBody(self):
+        # this returns the uncalibrated digital values of all records, it has one row per record with the channels concatenated
+        # for EDF files it is a view into the memory mapped file, without making a copy
+        return self._digital(self._mm).reshape(self._mm.shape[0], self._samp_offsets[-1])
 
 ####################################################################################################
 # the following are a number  of helper functions to make the behaviour of this EDFReader
@@ -372,10 +568,7 @@ if False:
 
     file_out.writeHeader(header)
 
-    meas_info = header[0]
-    for i in range(meas_info['n_records']):
-        data = file_in.readBlock(i)
-        file_out.writeBlock(data)
+    file_out.writeBody(file_in.readBody())
 
     file_in.close()
     file_out.close()